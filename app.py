@@ -4,51 +4,195 @@ WebSocket Test Service with Health Check
 
 This service provides:
 1. Health check endpoint at root path (/)
-2. WebSocket server for testing connections
+2. WebSocket server for testing connections, on the same port
 3. Simple echo functionality for WebSocket messages
 4. Container/Pod identification for load balancer testing
 """
 
 import asyncio
-import json
+import functools
+import itertools
 import logging
 import os
+import re
+import signal
 import socket
+import sys
+import time
 import uuid
 from datetime import datetime
-from typing import Dict, Set
+from typing import Dict, Optional, Tuple
 
-import websockets
-from websockets.server import WebSocketServerProtocol
-from aiohttp import web, WSMsgType
-import aiohttp_cors
+import orjson
+from aiohttp import web, WSCloseCode, WSMsgType
 
 # Configure logging
 logging.basicConfig(
-    level=logging.INFO,
+    level=os.environ.get('LOG_LEVEL', 'INFO').upper(),
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
+# orjson returns UTF-8 bytes and serializes datetime objects natively
+_dumps = orjson.dumps
+_loads = orjson.loads
+
+
+def _dumps_str(obj) -> str:
+    """Serialize to a JSON str for text frames"""
+    return _dumps(obj).decode()
+
+# Inbound messages are logged in full at DEBUG; at INFO only one in this
+# many is logged so busy connections don't serialize on the log handler
+MESSAGE_LOG_SAMPLE_RATE = 1000
+_message_counter = itertools.count(1)
+
+def log_message(source: str, client_ip: str, message):
+    """Log a received WebSocket message"""
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("%s message from %s: %s", source, client_ip, message)
+    elif next(_message_counter) % MESSAGE_LOG_SAMPLE_RATE == 0:
+        logger.info("%s message from %s (1 in %d logged): %s", source, client_ip, MESSAGE_LOG_SAMPLE_RATE, message)
+
+# Leading characters of messages worth handing to the JSON parser
+_JSON_OBJECT_OPENERS = ("{", b"{")
+_JSON_OPENERS = ("{", "[")
+
+def _first_char(message):
+    """Get the first non-whitespace character of a str or bytes message"""
+    head = message[:1]
+    if head.isspace():
+        head = message.lstrip()[:1]
+    return head
+
+# Timestamps are cached and refreshed at most once per millisecond
+_TIMESTAMP_REFRESH_NS = 1_000_000
+_cached_ts_ns = 0
+_cached_ts_str = ""
+_cached_ts_bytes = b""
+
+def _refresh_timestamp():
+    """Refresh the cached ISO timestamp if it is older than the refresh interval"""
+    global _cached_ts_ns, _cached_ts_str, _cached_ts_bytes
+    now_ns = time.monotonic_ns()
+    if now_ns - _cached_ts_ns >= _TIMESTAMP_REFRESH_NS:
+        _cached_ts_ns = now_ns
+        _cached_ts_str = datetime.utcnow().isoformat()
+        _cached_ts_bytes = _cached_ts_str.encode()
+
+def now_iso() -> bytes:
+    """Get the current UTC time as ISO-8601 bytes"""
+    _refresh_timestamp()
+    return _cached_ts_bytes
+
+def now_iso_str() -> str:
+    """Get the current UTC time as an ISO-8601 string"""
+    _refresh_timestamp()
+    return _cached_ts_str
+
+class ConnectionRegistry:
+    """Track active WebSocket connections for broadcasting"""
+    
+    def __init__(self):
+        # Closed connections are only marked dead and swept out periodically,
+        # so churn doesn't invalidate the cached broadcast snapshot
+        self._connections: Dict[int, web.WebSocketResponse] = {}
+        self._next_id = itertools.count()
+        self._live_count = 0
+        self._dead_count = 0
+        # Bumped whenever the stored connections change
+        self._generation = 0
+        self._snapshot: Tuple[web.WebSocketResponse, ...] = ()
+        self._snapshot_generation = 0
+    
+    def __len__(self) -> int:
+        """Number of live connections"""
+        return self._live_count
+    
+    def add(self, websocket: web.WebSocketResponse):
+        """Register a new connection"""
+        websocket.connection_id = next(self._next_id)
+        websocket.alive = True
+        self._connections[websocket.connection_id] = websocket
+        self._live_count += 1
+        self._generation += 1
+    
+    def discard(self, websocket: web.WebSocketResponse):
+        """Mark a connection dead; it is removed on the next sweep"""
+        if websocket.alive:
+            websocket.alive = False
+            self._live_count -= 1
+            self._dead_count += 1
+    
+    def snapshot(self) -> Tuple[web.WebSocketResponse, ...]:
+        """Get all stored connections, rebuilding only after they changed"""
+        if self._snapshot_generation != self._generation:
+            self._snapshot = tuple(self._connections.values())
+            self._snapshot_generation = self._generation
+        return self._snapshot
+    
+    def sweep(self):
+        """Remove connections marked dead"""
+        if not self._dead_count:
+            return
+        
+        for connection_id in [cid for cid, ws in self._connections.items() if not ws.alive]:
+            del self._connections[connection_id]
+        self._dead_count = 0
+        self._generation += 1
+
 # Store active WebSocket connections
-active_connections: Set[WebSocketServerProtocol] = set()
+active_connections = ConnectionRegistry()
+
+# Options shared by both WebSocket endpoints. A short heartbeat and receive
+# timeout evict dead peers quickly, and a small message limit bounds
+# per-connection buffers. Messages are small JSON control frames, where
+# permessage-deflate costs more CPU (and a zlib context per connection)
+# than it saves in bandwidth
+WEBSOCKET_OPTIONS = {
+    "heartbeat": 10,
+    "receive_timeout": 30,
+    "compress": False,
+    "max_msg_size": 2**18,
+}
+# Messages buffered per connection before new ones are dropped as a slow client
+SEND_QUEUE_SIZE = 256
+# Seconds a single peer may take to accept a message before it is disconnected
+SEND_TIMEOUT = 5.0
+# Number of server processes. Each worker keeps its own active connections,
+# so broadcasts only reach clients connected to the same worker
+WORKERS = max(1, int(os.environ.get('WORKERS', '1')))
+# Event loop implementation: "uvloop" (default), "io_uring" (opt-in, Linux
+# 5.15+ with asyncio_uring installed, else uvloop) or "asyncio"
+EVENT_LOOP = os.environ.get('EVENT_LOOP', 'uvloop').lower()
+# Seconds between sweeps that drop closed connections from the registry
+CONNECTION_SWEEP_INTERVAL = 1.0
+# Number of peers sent to per event-loop iteration during a broadcast
+BROADCAST_BATCH_SIZE = max(1, int(os.environ.get('BROADCAST_BATCH_SIZE', '64')))
 
 class ServiceIdentity:
     """Handle service instance identification"""
     
-    def __init__(self):
+    def __init__(self, worker_id: Optional[int] = None):
         self.instance_id = str(uuid.uuid4())[:8]  # Short UUID for identification
+        self.worker_id = worker_id  # Worker index when running several processes
         self.hostname = self._get_hostname()
-        self.container_ip = self._get_container_ip()
         self.pod_name = self._get_pod_name()
         self.node_name = self._get_node_name()
         self.namespace = self._get_namespace()
         self.service_name = self._get_service_name()
-        
-        # Create a comprehensive identity
-        self.identity = self._create_identity()
-        
-        logger.info(f"Service Identity: {self.identity}")
+    
+    @functools.cached_property
+    def identity(self) -> Dict:
+        """Comprehensive identity, created the first time it is needed"""
+        identity = self._create_identity()
+        logger.info(f"Service Identity: {identity}")
+        return identity
+    
+    @functools.cached_property
+    def identity_json(self) -> bytes:
+        """Identity encoded as JSON; it never changes for the process lifetime"""
+        return _dumps(self.identity)
     
     def _get_hostname(self) -> str:
         """Get hostname of the container/pod"""
@@ -58,7 +202,8 @@ class ServiceIdentity:
             logger.error(f"Failed to get hostname: {e}")
             return "unknown-host"
     
-    def _get_container_ip(self) -> str:
+    @functools.cached_property
+    def container_ip(self) -> str:
         """Get container IP address"""
         try:
             # Try to get IP by connecting to a dummy address
@@ -96,6 +241,7 @@ class ServiceIdentity:
             "namespace": self.namespace,
             "service_name": self.service_name,
             "environment": self._detect_environment(),
+            "worker_id": self.worker_id,
             "display_name": self._get_display_name()
         }
     
@@ -111,123 +257,212 @@ class ServiceIdentity:
     def _get_display_name(self) -> str:
         """Get a user-friendly display name for the service instance"""
         if self.pod_name:
-            return f"{self.service_name}-{self.pod_name}"
+            name = f"{self.service_name}-{self.pod_name}"
         elif self.hostname != "unknown-host":
-            return f"{self.service_name}-{self.hostname}"
+            name = f"{self.service_name}-{self.hostname}"
         else:
-            return f"{self.service_name}-{self.instance_id}"
+            name = f"{self.service_name}-{self.instance_id}"
+        
+        if self.worker_id is not None:
+            name = f"{name}-worker{self.worker_id}"
+        return name
     
     def get_info(self) -> Dict:
         """Get service identity information"""
-        return self.identity.copy()
+        return self.identity
 
 # Initialize service identity
 service_identity = ServiceIdentity()
 
+# Welcome text suffix for the HTTP WebSocket endpoint
+HTTP_WELCOME_SUFFIX = " via HTTP WebSocket"
+
+@functools.cache
+def _welcome_message(suffix: str) -> bytes:
+    """Encode the welcome text for an endpoint once"""
+    return _dumps(f"Connected to {service_identity.identity['display_name']}{suffix}")
+
+def build_welcome(client_ip: str, suffix: str = "") -> bytes:
+    """Build the welcome payload by splicing per-connection fields into the cached identity"""
+    return (
+        b'{"type":"welcome","message":' + _welcome_message(suffix)
+        + b',"timestamp":"' + now_iso() + b'"'
+        + b',"client_ip":' + _dumps(client_ip)
+        + b',"service_identity":' + service_identity.identity_json
+        + b'}'
+    )
+
+# Constant parts of the health check payload, around its dynamic fields
+HEALTH_PREFIX = b'{"status":"healthy","timestamp":"'
+HEALTH_CONNECTIONS = b'","active_websocket_connections":'
+
+@functools.cache
+def _health_suffix() -> bytes:
+    """Encode the constant tail of the health check payload once"""
+    return (
+        b',"service":"websocket-test-service","version":"1.0.0","service_identity":'
+        + service_identity.identity_json
+        + b'}'
+    )
+
+# Templates for the common fixed-shape replies; the inbound message is
+# already valid JSON, so it is spliced in as received instead of re-encoded
+PONG_TEMPLATE = '{"type":"pong","timestamp":"%s","original_data":%s}'
+ECHO_RESPONSE_TEMPLATE = '{"type":"echo_response","timestamp":"%s","echoed_data":%s}'
+BROADCAST_CONFIRMATION_TEMPLATE = '{"type":"broadcast_confirmation","timestamp":"%s","recipients":%d}'
+HTTP_ECHO_TEMPLATE = '{"type":"http_echo","timestamp":"%s","echoed_data":%s}'
+ERROR_TEMPLATE = '{"type":"error","timestamp":"%s","message":%s,"received_data":%s}'
+
 class WebSocketHandler:
     """Handle WebSocket connections and messages"""
     
     @staticmethod
-    async def handle_websocket(websocket: WebSocketServerProtocol, path: str):
+    async def handle_websocket(request):
         """Handle new WebSocket connection"""
-        client_ip = websocket.remote_address[0] if websocket.remote_address else "unknown"
-        logger.info(f"New WebSocket connection from {client_ip} on path: {path}")
+        websocket = web.WebSocketResponse(**WEBSOCKET_OPTIONS)
+        await websocket.prepare(request)
         
-        # Add connection to active set
+        client_ip = request.remote or "unknown"
+        # Cache the peer address for messages that report the sender
+        websocket.client_ip = client_ip
+        logger.info(f"New WebSocket connection from {client_ip} on path: {request.path}")
+        
+        # Outgoing messages are queued and written by a dedicated task so
+        # handlers and broadcasts never wait on a slow peer's socket
+        websocket.out_queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+        websocket.slow = False
+        writer = asyncio.create_task(WebSocketHandler.write_messages(websocket))
+        
+        # Add connection to active connections
         active_connections.add(websocket)
         
         try:
             # Send welcome message with service identity
-            welcome_msg = {
-                "type": "welcome",
-                "message": f"Connected to {service_identity.identity['display_name']}",
-                "timestamp": datetime.utcnow().isoformat(),
-                "client_ip": client_ip,
-                "service_identity": service_identity.get_info()
-            }
-            await websocket.send(json.dumps(welcome_msg))
+            WebSocketHandler.send(websocket, build_welcome(client_ip).decode())
             
             # Handle messages
-            async for message in websocket:
-                # Log all received messages
-                logger.info(f"WebSocket message from {client_ip}: {message}")
-                
-                try:
-                    # Try to parse as JSON
-                    data = json.loads(message)
-                    # Check if parsed data is a dictionary (JSON object)
-                    if isinstance(data, dict):
-                        await WebSocketHandler.handle_json_message(websocket, data)
-                    else:
-                        # If it's a valid JSON but not an object (e.g., number, string, array)
-                        # treat it as plain text
-                        await WebSocketHandler.handle_text_message(websocket, message)
-                except json.JSONDecodeError:
-                    # Handle as plain text
-                    await WebSocketHandler.handle_text_message(websocket, message)
+            async for msg in websocket:
+                if msg.type in (WSMsgType.TEXT, WSMsgType.BINARY):
+                    message = msg.data
+                    log_message("WebSocket", client_ip, message)
+                    
+                    # Only a JSON object gets JSON handling, so skip the parser
+                    # entirely unless the message could be one
+                    if _first_char(message) in _JSON_OBJECT_OPENERS:
+                        try:
+                            data = _loads(message)
+                        except orjson.JSONDecodeError:
+                            data = None
+                        
+                        if isinstance(data, dict):
+                            # orjson only accepts valid UTF-8, so a binary
+                            # frame that parsed decodes cleanly
+                            if msg.type == WSMsgType.BINARY:
+                                message = message.decode()
+                            await WebSocketHandler.handle_json_message(websocket, data, message)
+                            continue
+                    
+                    # Binary frames are only understood as JSON objects
+                    if msg.type == WSMsgType.BINARY:
+                        await websocket.close(
+                            code=WSCloseCode.UNSUPPORTED_DATA,
+                            message=b"binary frames must be JSON objects"
+                        )
+                        break
                     
-        except websockets.exceptions.ConnectionClosed:
+                    # Anything else (plain text, numbers, strings, arrays or
+                    # malformed JSON) is treated as plain text
+                    await WebSocketHandler.handle_text_message(websocket, message)
+                elif msg.type == WSMsgType.ERROR:
+                    logger.error(f'WebSocket error: {websocket.exception()}')
+            
             logger.info(f"WebSocket connection closed for {client_ip}")
+        except asyncio.TimeoutError:
+            logger.info(f"WebSocket connection timed out for {client_ip}")
+            await websocket.close()
         except Exception as e:
             logger.error(f"Error in WebSocket handler: {e}")
         finally:
-            # Remove connection from active set
+            # Remove connection from active connections
+            active_connections.discard(websocket)
+            writer.cancel()
+        
+        return websocket
+    
+    @staticmethod
+    async def write_messages(websocket: web.WebSocketResponse):
+        """Drain the connection's send queue onto the socket"""
+        try:
+            while True:
+                message = await websocket.out_queue.get()
+                await asyncio.wait_for(websocket.send_str(message), timeout=SEND_TIMEOUT)
+        except ConnectionResetError:
+            pass
+        except asyncio.TimeoutError:
+            logger.warning("Timed out sending to connection, closing it")
+            await websocket.close(code=WSCloseCode.INTERNAL_ERROR, message=b"send timeout")
+        except Exception as e:
+            logger.error(f"Error in WebSocket writer: {e}")
+        finally:
+            # Nothing more can be sent, so stop broadcasting to it
             active_connections.discard(websocket)
     
     @staticmethod
-    async def handle_json_message(websocket: WebSocketServerProtocol, data: Dict):
-        """Handle JSON message from client"""
+    def send(websocket: web.WebSocketResponse, message: str):
+        """Queue a message for the connection's writer task"""
+        try:
+            websocket.out_queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Messages to a slow connection are dropped; warn only the first
+            # time so a broadcast storm doesn't log once per message
+            if not websocket.slow:
+                websocket.slow = True
+                logger.warning(f"Send queue full for {websocket.client_ip}, dropping messages for slow connection")
+    
+    @staticmethod
+    async def handle_json_message(websocket: web.WebSocketResponse, data: Dict, raw: str):
+        """Handle JSON message from client, given both parsed and as received"""
         message_type = data.get("type", "unknown")
         
         if message_type == "ping":
             # Respond to ping with pong
-            response = {
-                "type": "pong",
-                "timestamp": datetime.utcnow().isoformat(),
-                "original_data": data
-            }
+            response = PONG_TEMPLATE % (now_iso_str(), raw)
         elif message_type == "echo":
             # Echo the message back
-            response = {
-                "type": "echo_response",
-                "timestamp": datetime.utcnow().isoformat(),
-                "echoed_data": data
-            }
+            response = ECHO_RESPONSE_TEMPLATE % (now_iso_str(), raw)
         elif message_type == "broadcast":
             # Broadcast message to all connected clients
             broadcast_msg = {
                 "type": "broadcast",
-                "timestamp": datetime.utcnow().isoformat(),
+                "timestamp": now_iso_str(),
                 "message": data.get("message", ""),
-                "sender": websocket.remote_address[0] if websocket.remote_address else "unknown"
-            }
-            await WebSocketHandler.broadcast_message(broadcast_msg)
-            response = {
-                "type": "broadcast_confirmation",
-                "timestamp": datetime.utcnow().isoformat(),
-                "recipients": len(active_connections)
+                "sender": websocket.client_ip
             }
+            try:
+                await WebSocketHandler.broadcast_message(broadcast_msg)
+            except orjson.JSONEncodeError as e:
+                # orjson refuses payloads nested deeper than it can encode;
+                # nothing has been queued yet, so only the sender is told
+                response = ERROR_TEMPLATE % (now_iso_str(), _dumps_str(f"Cannot broadcast message: {e}"), raw)
+            else:
+                response = BROADCAST_CONFIRMATION_TEMPLATE % (now_iso_str(), len(active_connections))
         else:
-            # Unknown message type
-            response = {
-                "type": "error",
-                "timestamp": datetime.utcnow().isoformat(),
-                "message": f"Unknown message type: {message_type}",
-                "received_data": data
-            }
+            # Unknown message type; the received data is spliced in as
+            # received, so it is never re-encoded however deeply it nests
+            response = ERROR_TEMPLATE % (now_iso_str(), _dumps_str(f"Unknown message type: {message_type}"), raw)
         
-        await websocket.send(json.dumps(response))
+        WebSocketHandler.send(websocket, response)
     
     @staticmethod
-    async def handle_text_message(websocket: WebSocketServerProtocol, message: str):
+    async def handle_text_message(websocket: web.WebSocketResponse, message: str):
         """Handle plain text message from client"""
         response = {
             "type": "text_echo",
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": now_iso_str(),
             "original_message": message,
             "message_length": len(message)
         }
-        await websocket.send(json.dumps(response))
+        WebSocketHandler.send(websocket, _dumps_str(response))
     
     @staticmethod
     async def broadcast_message(message: Dict):
@@ -235,43 +470,53 @@ class WebSocketHandler:
         if not active_connections:
             return
         
-        message_str = json.dumps(message)
-        # Send message to all active connections
-        disconnected = set()
+        # Serialized once and shared by every batch. The string is not copied
+        # into a reusable buffer: each connection builds its own frame bytes
+        # from it anyway, so reuse would save no allocations. A message orjson
+        # cannot encode raises here, before anything is queued
+        message_str = _dumps_str(message)
+        # The snapshot is reused between broadcasts and stays stable while we
+        # yield between batches
+        connections = active_connections.snapshot()
         
-        for connection in active_connections:
-            try:
-                await connection.send(message_str)
-            except websockets.exceptions.ConnectionClosed:
-                disconnected.add(connection)
-            except Exception as e:
-                logger.error(f"Error broadcasting to connection: {e}")
-                disconnected.add(connection)
-        
-        # Remove disconnected connections
-        for conn in disconnected:
-            active_connections.discard(conn)
+        # The same message is queued on every connection still alive; dead
+        # ones stay in the snapshot until the next sweep
+        for start in range(0, len(connections), BROADCAST_BATCH_SIZE):
+            for connection in connections[start:start + BROADCAST_BATCH_SIZE]:
+                if connection.alive:
+                    WebSocketHandler.send(connection, message_str)
+            
+            # Yield between batches so a large fan-out doesn't starve health
+            # checks and new connections
+            await asyncio.sleep(0)
 
 class HTTPHandler:
     """Handle HTTP requests"""
     
+    @staticmethod
+    async def index(request):
+        """Serve the health check, or the WebSocket service on upgrade requests"""
+        if request.headers.get("Upgrade", "").lower() == "websocket":
+            return await WebSocketHandler.handle_websocket(request)
+        return await HTTPHandler.health_check(request)
+    
     @staticmethod
     async def health_check(request):
         """Health check endpoint"""
-        health_data = {
-            "status": "healthy",
-            "timestamp": datetime.utcnow().isoformat(),
-            "active_websocket_connections": len(active_connections),
-            "service": "websocket-test-service",
-            "version": "1.0.0",
-            "service_identity": service_identity.get_info()
-        }
-        return web.json_response(health_data, status=200)
+        # Only the timestamp and connection count change between requests
+        body = b"".join((
+            HEALTH_PREFIX,
+            now_iso(),
+            HEALTH_CONNECTIONS,
+            str(len(active_connections)).encode(),
+            _health_suffix()
+        ))
+        return web.Response(body=body, status=200, content_type="application/json", charset="utf-8")
     
     @staticmethod
     async def websocket_endpoint(request):
         """HTTP to WebSocket upgrade endpoint"""
-        ws = web.WebSocketResponse()
+        ws = web.WebSocketResponse(**WEBSOCKET_OPTIONS)
         await ws.prepare(request)
         
         client_ip = request.remote
@@ -279,83 +524,91 @@ class HTTPHandler:
         
         try:
             # Send welcome message with service identity
-            welcome_msg = {
-                "type": "welcome",
-                "message": f"Connected to {service_identity.identity['display_name']} via HTTP WebSocket",
-                "timestamp": datetime.utcnow().isoformat(),
-                "client_ip": client_ip,
-                "service_identity": service_identity.get_info()
-            }
-            await ws.send_str(json.dumps(welcome_msg))
+            await ws.send_str(build_welcome(client_ip, HTTP_WELCOME_SUFFIX).decode())
             
             async for msg in ws:
                 if msg.type == WSMsgType.TEXT:
-                    # Log all received messages
-                    logger.info(f"HTTP WebSocket message from {client_ip}: {msg.data}")
+                    log_message("HTTP WebSocket", client_ip, msg.data)
+                    
+                    response = None
+                    # Only JSON objects and arrays are echoed as JSON, so skip
+                    # the parser unless the message could be one. The parse
+                    # only validates; the message is echoed as received
+                    if _first_char(msg.data) in _JSON_OPENERS:
+                        try:
+                            _loads(msg.data)
+                            response = HTTP_ECHO_TEMPLATE % (now_iso_str(), msg.data)
+                        except orjson.JSONDecodeError:
+                            pass
                     
-                    try:
-                        data = json.loads(msg.data)
-                        response = {
-                            "type": "http_echo",
-                            "timestamp": datetime.utcnow().isoformat(),
-                            "echoed_data": data
-                        }
-                        await ws.send_str(json.dumps(response))
-                    except json.JSONDecodeError:
-                        response = {
+                    if response is None:
+                        response = _dumps_str({
                             "type": "text_echo",
-                            "timestamp": datetime.utcnow().isoformat(),
+                            "timestamp": now_iso_str(),
                             "original_message": msg.data
-                        }
-                        await ws.send_str(json.dumps(response))
+                        })
+                    await ws.send_str(response)
                 elif msg.type == WSMsgType.ERROR:
                     logger.error(f'WebSocket error: {ws.exception()}')
                     
+        except asyncio.TimeoutError:
+            logger.info(f"HTTP WebSocket connection timed out for {client_ip}")
+            await ws.close()
         except Exception as e:
             logger.error(f"Error in HTTP WebSocket handler: {e}")
         
         return ws
 
+# Fixed CORS policy: every origin may read every endpoint
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Expose-Headers": "*",
+}
+CORS_PREFLIGHT_HEADERS = {
+    "Access-Control-Allow-Methods": "*",
+    "Access-Control-Allow-Headers": "*",
+}
+
+async def sweep_connections(app):
+    """Periodically remove dead connections while the application runs"""
+    async def sweep_periodically():
+        while True:
+            await asyncio.sleep(CONNECTION_SWEEP_INTERVAL)
+            active_connections.sweep()
+    
+    task = asyncio.create_task(sweep_periodically())
+    yield
+    task.cancel()
+
+async def add_cors_headers(request, response):
+    """Add CORS headers to every response before it is sent"""
+    response.headers.update(CORS_HEADERS)
+
+async def cors_preflight(request):
+    """Answer CORS preflight requests"""
+    return web.Response(status=204, headers=CORS_PREFLIGHT_HEADERS)
+
 async def create_app():
     """Create and configure the web application"""
     app = web.Application()
     
-    # Setup CORS
-    cors = aiohttp_cors.setup(app, defaults={
-        "*": aiohttp_cors.ResourceOptions(
-            allow_credentials=True,
-            expose_headers="*",
-            allow_headers="*",
-            allow_methods="*"
-        )
-    })
+    # Setup CORS; headers are added as responses are prepared so they are
+    # also present on WebSocket upgrade responses
+    app.on_response_prepare.append(add_cors_headers)
+    app.cleanup_ctx.append(sweep_connections)
     
     # Add routes
-    app.router.add_get('/', HTTPHandler.health_check)
+    app.router.add_get('/', HTTPHandler.index)
     app.router.add_get('/health', HTTPHandler.health_check)
     app.router.add_get('/ws', HTTPHandler.websocket_endpoint)
     
-    # Add CORS to all routes
-    for route in list(app.router.routes()):
-        cors.add(route)
+    # Answer preflights on the same paths, so unknown paths still 404
+    for path in ('/', '/health', '/ws'):
+        app.router.add_route('OPTIONS', path, cors_preflight)
     
     return app
 
-async def start_websocket_server(host: str = "0.0.0.0", port: int = 8765):
-    """Start the standalone WebSocket server"""
-    logger.info(f"Starting WebSocket server on {host}:{port}")
-    
-    server = await websockets.serve(
-        WebSocketHandler.handle_websocket,
-        host,
-        port,
-        ping_interval=30,
-        ping_timeout=10
-    )
-    
-    return server
-
-async def start_http_server(host: str = "0.0.0.0", port: int = 8080):
+async def start_http_server(host: str = "0.0.0.0", port: int = 8080, reuse_port: bool = False):
     """Start the HTTP server"""
     app = await create_app()
     
@@ -363,41 +616,146 @@ async def start_http_server(host: str = "0.0.0.0", port: int = 8080):
     runner = web.AppRunner(app, access_log=None)
     await runner.setup()
     
-    site = web.TCPSite(runner, host, port)
+    # With SO_REUSEPORT every worker binds the same port and the kernel
+    # spreads accepted connections across them
+    site = web.TCPSite(runner, host, port, reuse_port=reuse_port)
     await site.start()
     
     logger.info(f"HTTP server started on {host}:{port}")
-    logger.info(f"WebSocket endpoint available at: ws://{host}:{port}/ws")
+    logger.info(f"WebSocket endpoints available at: ws://{host}:{port}/ and ws://{host}:{port}/ws")
     
     return runner
 
-async def main():
+async def main(reuse_port: bool = False):
     """Main application entry point"""
-    logger.info("Starting WebSocket Test Service...")
+    logger.info(f"Starting WebSocket Test Service (PID {os.getpid()})...")
     
-    # Start both servers
-    websocket_server = await start_websocket_server()
-    http_runner = await start_http_server()
+    # Start the server
+    http_runner = await start_http_server(reuse_port=reuse_port)
     
     logger.info("=== WebSocket Test Service Started ===")
-    logger.info(f"Service Instance: {service_identity.identity['display_name']}")
-    logger.info(f"Environment: {service_identity.identity['environment']}")
+    logger.info(f"Event Loop: {type(asyncio.get_running_loop()).__module__}")
     logger.info("Available endpoints:")
     logger.info("  - Health Check: http://localhost:8080/")
+    logger.info("  - WebSocket: ws://localhost:8080/")
     logger.info("  - HTTP WebSocket: ws://localhost:8080/ws")
-    logger.info("  - Standalone WebSocket: ws://localhost:8765/")
     logger.info("=======================================")
     
     try:
-        # Keep servers running
+        # Keep server running
         await asyncio.Future()  # Run forever
     except KeyboardInterrupt:
-        logger.info("Shutting down servers...")
+        logger.info("Shutting down server...")
     finally:
-        websocket_server.close()
-        await websocket_server.wait_closed()
         await http_runner.cleanup()
-        logger.info("Servers stopped.")
+        logger.info("Server stopped.")
+
+def _kernel_supports_io_uring() -> bool:
+    """Check for Linux 5.15+, where io_uring covers the socket operations we need"""
+    if not sys.platform.startswith("linux"):
+        return False
+    match = re.match(r"(\d+)\.(\d+)", os.uname().release)
+    return bool(match) and (int(match.group(1)), int(match.group(2))) >= (5, 15)
+
+def install_event_loop_policy():
+    """Select the asyncio event loop implementation from EVENT_LOOP"""
+    if EVENT_LOOP == "asyncio":
+        return
+    
+    if EVENT_LOOP == "io_uring":
+        if _kernel_supports_io_uring():
+            try:
+                import asyncio_uring
+                asyncio.set_event_loop_policy(asyncio_uring.EventLoopPolicy())
+                return
+            except (ImportError, AttributeError) as e:
+                logger.warning(f"io_uring event loop not available ({e}), falling back to uvloop")
+        else:
+            logger.warning("io_uring event loop requires Linux 5.15 or newer, falling back to uvloop")
+    
+    try:
+        import uvloop
+    except ImportError:
+        logger.info("uvloop not available, using default asyncio event loop")
+        return
+    
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+def init_worker_identity(worker_id: int):
+    """Give a forked worker its own service identity"""
+    global service_identity
+    service_identity = ServiceIdentity(worker_id)
+    _welcome_message.cache_clear()
+    _health_suffix.cache_clear()
+
+def run_workers(count: int):
+    """Fork worker processes that share the HTTP port via SO_REUSEPORT"""
+    children = {}
+    for worker_id in range(count):
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 1
+            try:
+                # Each worker has its own connections and broadcast domain,
+                # so it reports as a separate instance
+                init_worker_identity(worker_id)
+                install_event_loop_policy()
+                asyncio.run(main(reuse_port=True))
+                exit_code = 0
+            except KeyboardInterrupt:
+                exit_code = 0
+            except BaseException:
+                logger.exception(f"Worker {worker_id} (PID {os.getpid()}) failed")
+            finally:
+                os._exit(exit_code)
+        children[pid] = worker_id
+    
+    logger.info(f"Started {count} workers: {list(children)}")
+    
+    stopping = False
+    
+    def stop_workers(signum, frame=None):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+    
+    # Workers receive Ctrl+C from the terminal themselves; SIGTERM (e.g. from
+    # docker stop) only reaches this process and has to be passed on
+    signal.signal(signal.SIGTERM, stop_workers)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    
+    # Reap workers in whatever order they exit. The first one to die
+    # unexpectedly takes the others down with it, so the process exits
+    # non-zero and the orchestrator restarts the whole pod rather than
+    # leaving it serving with fewer workers
+    failed = False
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        worker_id = children.pop(pid)
+        exit_code = os.waitstatus_to_exitcode(status)
+        # Being stopped by the SIGTERM forwarded above is a normal shutdown
+        if exit_code == 0 or (stopping and exit_code == -signal.SIGTERM):
+            continue
+        failed = True
+        logger.error(f"Worker {worker_id} (PID {pid}) exited with status {exit_code}")
+        if not stopping:
+            logger.error("Stopping the remaining workers")
+            stop_workers(signal.SIGTERM)
+    
+    if failed:
+        sys.exit(1)
+    logger.info("All workers stopped.")
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if WORKERS > 1 and hasattr(os, "fork"):
+        run_workers(WORKERS)
+    else:
+        install_event_loop_policy()
+        asyncio.run(main())